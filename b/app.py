@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 from faker import Faker
 from playwright.sync_api import sync_playwright
@@ -6,7 +6,24 @@ import time
 import random
 import os
 import re
+import io
+import json
+import uuid
+import cProfile
+import pstats
+import tempfile
+import shutil
+import threading
+import atexit
+import hashlib
+import math
+import itertools
+import logging
 import requests
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from logging.handlers import RotatingFileHandler
 from typing import Optional
 
 app = Flask(__name__)
@@ -19,6 +36,28 @@ fake = Faker()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
 
+# Profiling artifacts (Playwright traces, CPU profiles, stage timings) are written here per job
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'form-filler-profiles'))
+
+# Finished jobs (and their profiling artifacts) are forgotten after this long, or once too many are kept
+JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', 6 * 60 * 60))
+MAX_TRACKED_JOBS = int(os.getenv('MAX_TRACKED_JOBS', 100))
+
+# Shared static asset cache (Google Forms JS/CSS/fonts) reused across browser contexts; 0 MB disables it
+ASSET_CACHE_DIR = os.getenv('ASSET_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'form-filler-asset-cache'))
+ASSET_CACHE_MAX_MB = int(os.getenv('ASSET_CACHE_MAX_MB', 200))
+
+# Admission control: concurrent browser slots, jobs allowed to wait for one, and a memory ceiling (0 = no ceiling)
+MAX_BROWSER_SLOTS = int(os.getenv('MAX_BROWSER_SLOTS', 2))
+MAX_QUEUED_JOBS = int(os.getenv('MAX_QUEUED_JOBS', 4))
+QUEUE_TIMEOUT_SECONDS = int(os.getenv('QUEUE_TIMEOUT_SECONDS', 120))
+MAX_MEMORY_MB = int(os.getenv('MAX_MEMORY_MB', 0))
+
+# Append-only JSON-lines log of every submission (identity, answers, timings, outcome), rotated by size
+RESULTS_LOG_PATH = os.getenv('RESULTS_LOG_PATH', os.path.join(tempfile.gettempdir(), 'form-filler-results', 'results.jsonl'))
+RESULTS_LOG_MAX_MB = int(os.getenv('RESULTS_LOG_MAX_MB', 50))
+RESULTS_LOG_BACKUPS = int(os.getenv('RESULTS_LOG_BACKUPS', 5))
+
 # --- New: HTTP helper for Gemini to avoid SDK typing/export issues ---
 def _gemini_generate_http(prompt: str, *, temperature: float, top_p: float, top_k: int, max_tokens: int, model: str = GEMINI_MODEL) -> Optional[str]:
     if not GEMINI_API_KEY:
@@ -124,6 +163,63 @@ def _is_generic_name_label(text: str) -> bool:
         return False
     return any(p in t for p in NAME_LABEL_PATTERNS)
 
+# --- New: Helpers to label answers for the per-submission results log ---
+_QUESTION_LABEL_JS = '''(el) => {
+    const label = el.getAttribute('aria-label');
+    if (label) return label;
+    const ids = (el.getAttribute('aria-labelledby') || '').split(' ').filter(Boolean);
+    const text = ids.map(id => { const n = document.getElementById(id); return n ? n.innerText : ''; }).join(' ').trim();
+    if (text) return text;
+    const item = el.closest('div[role="listitem"]');
+    const heading = item && item.querySelector('div[role="heading"]');
+    return heading ? heading.innerText : '';
+}'''
+
+def _question_label(page, element, fallback):
+    """Best-effort question text for an element (aria-label, aria-labelledby, then item heading)."""
+    try:
+        text = page.evaluate(_QUESTION_LABEL_JS, element) or ''
+    except Exception:
+        text = ''
+    return _answer_key(text, fallback)
+
+def _answer_key(text, fallback):
+    text = ' '.join((text or '').split())[:200]
+    return text or fallback
+
+def _option_label(option):
+    try:
+        return option.get_attribute('data-value') or option.get_attribute('aria-label') or ''
+    except Exception:
+        return ''
+
+def _record_answer(answers, key, value):
+    """Store an answer, suffixing the key when two questions share the same label."""
+    if key in answers:
+        n = 2
+        while f"{key} ({n})" in answers:
+            n += 1
+        key = f"{key} ({n})"
+    answers[key] = value
+
+def _submission_confirmed(page):
+    """Whether Google Forms showed its confirmation page after submit.
+
+    The URL is not enough: "Next" on multi-section forms also posts to formResponse and
+    renders the following section, so look for the confirmation text or for a page with
+    no questions left to answer.
+    """
+    try:
+        if page.query_selector('text=/response has been recorded/i'):
+            return True
+        # Custom confirmation messages replace the default text, but the page has no questions
+        return 'formResponse' in page.url and page.query_selector(
+            'div[role="listitem"], input[type="text"], input[type="email"], textarea, '
+            'div[role="radio"], div[role="checkbox"], div[role="listbox"]'
+        ) is None
+    except Exception:
+        return False
+
 # AI Response Generator with integrated Gemini API (HTTP) and smart fallback
 def generate_ai_response(question_text, form_context="", response_tone="neutral"):
     """
@@ -303,6 +399,556 @@ def generate_ai_response(question_text, form_context="", response_tone="neutral"
         else:
             return f"This is {sentiment_word} overall. It presents a balanced mix of effective elements and areas that could benefit from improvement."
 
+# --- New: Content-addressed on-disk cache for static assets shared by every browser context ---
+class _StaticAssetCache:
+    """Serves cacheable GET assets (scripts, styles, fonts, images) from disk with size-bounded LRU eviction.
+
+    Entries are keyed by URL and point at a blob named by the SHA-256 of its body, so identical
+    bundles served from different URLs are stored once. The form HTML (a document request) and
+    the formResponse POST are never cached.
+    """
+
+    CACHEABLE_TYPES = {'script', 'stylesheet', 'font', 'image'}
+    # Hop-by-hop or body-encoding headers that no longer describe the decoded body we store
+    DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'set-cookie', 'date', 'age'}
+    # The index is rewritten at most this often (and once at exit) rather than on every stored asset
+    INDEX_SAVE_INTERVAL = 10.0
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._blob_dir = os.path.join(root, 'blobs')
+        self._index_path = os.path.join(root, 'index.json')
+        self._entries = OrderedDict()  # url -> {digest, size, expires, headers}, oldest first
+        self._blob_refs = {}  # digest -> number of entries pointing at it
+        self._bytes = 0  # bytes of distinct blobs on disk
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()  # serializes index writers without blocking lookups
+        self._index_dirty = False
+        self._index_saved_at = 0.0
+        os.makedirs(self._blob_dir, exist_ok=True)
+        self._load_index()
+        atexit.register(self.flush)
+
+    def attach(self, context):
+        """Route a browser context's requests through the cache and return its live hit/miss counters."""
+        stats = {"hits": 0, "misses": 0, "bytesServed": 0}
+        context.route('**/*', lambda route: self._handle(route, stats))
+        return stats
+
+    @staticmethod
+    def summarize(stats):
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hitRatio": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+    def _handle(self, route, stats):
+        req = route.request
+        if req.method != 'GET' or req.resource_type not in self.CACHEABLE_TYPES or 'formResponse' in req.url:
+            route.continue_()
+            return
+
+        # Any cache failure (disk full, permissions) falls back to a plain network fetch
+        try:
+            cached = self._lookup(req.url)
+        except Exception as e:
+            print(f"⚠️  Asset cache lookup failed for {req.url}: {e}")
+            cached = None
+        if cached:
+            headers, body = cached
+            stats["hits"] += 1
+            stats["bytesServed"] += len(body)
+            route.fulfill(status=200, headers=headers, body=body)
+            return
+
+        stats["misses"] += 1
+        try:
+            response = route.fetch()
+            body = response.body()
+        except Exception:
+            route.continue_()
+            return
+        ttl = self._freshness_lifetime(response.headers)
+        if response.status == 200 and ttl > 0:
+            try:
+                self._store(req.url, response.headers, body, ttl)
+                self._save_index_if_due()
+            except Exception as e:
+                print(f"⚠️  Asset cache store failed for {req.url}: {e}")
+        route.fulfill(response=response, body=body)
+
+    def flush(self):
+        """Write the index now if it has unsaved changes."""
+        try:
+            self._save_index_if_due(force=True)
+        except OSError as e:
+            print(f"⚠️  Could not save asset cache index: {e}")
+
+    @staticmethod
+    def _freshness_lifetime(headers):
+        """Seconds a response may still be reused for, per Cache-Control/Expires minus Age; 0 means do not cache.
+
+        This cache is shared by every context, so s-maxage wins over max-age.
+        """
+        vary = (headers.get('vary') or '').lower()
+        if vary and any(v.strip() not in ('accept-encoding', 'origin') for v in vary.split(',')):
+            return 0
+        cache_control = (headers.get('cache-control') or '').lower()
+        directives = [d.strip() for d in cache_control.split(',') if d.strip()]
+        if any(d in ('no-store', 'no-cache', 'private') for d in directives):
+            return 0
+        try:
+            age = max(0, int(headers.get('age') or 0))
+        except ValueError:
+            age = 0
+        for name in ('s-maxage=', 'max-age='):
+            for d in directives:
+                if d.startswith(name):
+                    try:
+                        return max(0, int(d.split('=', 1)[1]) - age)
+                    except ValueError:
+                        return 0
+        expires = headers.get('expires')
+        if expires:
+            try:
+                return max(0, int(parsedate_to_datetime(expires).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                return 0
+        return 0
+
+    def _lookup(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if not entry:
+                return None
+            if entry['expires'] <= time.time():
+                self._drop(url)
+                return None
+            self._entries.move_to_end(url)
+        try:
+            with open(os.path.join(self._blob_dir, entry['digest']), 'rb') as f:
+                return entry['headers'], f.read()
+        except OSError:
+            # Another job may have expired, evicted or re-stored this URL since the lock was released
+            with self._lock:
+                if self._entries.get(url) is entry:
+                    self._drop(url)
+            return None
+
+    def _store(self, url, headers, body, ttl):
+        if len(body) > self.max_bytes:
+            return
+        digest = hashlib.sha256(body).hexdigest()
+        blob_path = os.path.join(self._blob_dir, digest)
+        with self._lock:
+            if not os.path.exists(blob_path):
+                tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        f.write(body)
+                    os.replace(tmp_path, blob_path)
+                except OSError:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                    raise
+            # Reference the new blob before dropping any old entry for this URL, so a shared blob survives
+            self._add_ref(digest, len(body))
+            self._drop(url)
+            self._entries[url] = {
+                "digest": digest,
+                "size": len(body),
+                "expires": time.time() + ttl,
+                "headers": {k: v for k, v in headers.items() if k.lower() not in self.DROPPED_HEADERS},
+            }
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+            self._index_dirty = True
+
+    def _add_ref(self, digest, size):
+        if digest not in self._blob_refs:
+            self._blob_refs[digest] = 0
+            self._bytes += size
+        self._blob_refs[digest] += 1
+
+    def _drop(self, url):
+        """Remove an entry (caller holds the lock) and delete its blob once nothing else references it."""
+        entry = self._entries.pop(url, None)
+        if entry is None:
+            return
+        self._index_dirty = True
+        digest = entry['digest']
+        self._blob_refs[digest] -= 1
+        if self._blob_refs[digest] == 0:
+            del self._blob_refs[digest]
+            self._bytes -= entry['size']
+            try:
+                os.remove(os.path.join(self._blob_dir, digest))
+            except OSError:
+                pass
+
+    def _load_index(self):
+        """Restore entries whose blobs survived, enforce max_bytes, and delete unreferenced or partial files."""
+        try:
+            with open(self._index_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = []
+        for url, entry in saved:
+            if os.path.exists(os.path.join(self._blob_dir, entry['digest'])):
+                self._entries[url] = entry
+                self._add_ref(entry['digest'], entry['size'])
+        # The limit may have been lowered since the index was written
+        while self._bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+        # Blobs written just before a crash (never indexed) and leftover *.tmp files
+        for name in os.listdir(self._blob_dir):
+            if name not in self._blob_refs:
+                try:
+                    os.remove(os.path.join(self._blob_dir, name))
+                except OSError:
+                    pass
+
+    def _save_index_if_due(self, force=False):
+        """Snapshot the index under the lock, then write it outside it (throttled unless forced)."""
+        with self._index_lock:
+            with self._lock:
+                now = time.monotonic()
+                if not self._index_dirty or (not force and now - self._index_saved_at < self.INDEX_SAVE_INTERVAL):
+                    return
+                snapshot = list(self._entries.items())
+                self._index_dirty = False
+                self._index_saved_at = now
+            tmp_path = f"{self._index_path}.tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, self._index_path)
+            except OSError:
+                with self._lock:
+                    self._index_dirty = True
+                raise
+
+
+ASSET_CACHE = _StaticAssetCache(ASSET_CACHE_DIR, ASSET_CACHE_MAX_MB * 1024 * 1024) if ASSET_CACHE_MAX_MB > 0 else None
+
+# --- New: Admission control so bursts of jobs cannot launch more Chromium instances than the worker can hold ---
+_CGROUP_MEMORY_STATS = (('/sys/fs/cgroup/memory.stat', 'anon'), ('/sys/fs/cgroup/memory/memory.stat', 'total_rss'))
+
+
+def _current_memory_bytes():
+    """Anonymous memory in use by this worker's container, ignoring reclaimable page cache.
+
+    Reads `anon` from cgroup v2 or `total_rss` from cgroup v1 memory.stat. Cached asset blobs,
+    traces and logs fill the page cache, so raw cgroup usage would overstate memory pressure.
+    Without cgroup stats, falls back to the RSS of this process and its Chromium descendants.
+    """
+    for path, key in _CGROUP_MEMORY_STATS:
+        try:
+            with open(path) as f:
+                for line in f:
+                    name, _, value = line.partition(' ')
+                    if name == key:
+                        return int(value)
+        except (OSError, ValueError):
+            continue
+    return _process_tree_rss_bytes()
+
+
+def _process_tree_rss_bytes():
+    """RSS summed over this process and every descendant (pages shared between processes count more than once)."""
+    children = {}
+    try:
+        pids = [int(name) for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                # ppid is the second field after the parenthesised command name, which may contain spaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(pid)
+
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    total, stack = 0, [os.getpid()]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            pass
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class _AdmissionController:
+    """Tracks active browser slots, queued jobs and memory, admitting jobs only while there is room.
+
+    A job that cannot start immediately waits in a bounded FIFO queue; once the queue is full
+    (or the wait times out) the caller gets a Retry-After estimate built from the expected
+    finish times of running jobs and the work queued ahead.
+    """
+
+    def __init__(self, slots, max_queue, max_memory_bytes, queue_timeout):
+        self.slots = max(1, slots)
+        self.max_queue = max(0, max_queue)
+        self.max_memory_bytes = max_memory_bytes
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = {}  # ticket -> {"finishAt", "submissions"}
+        self._queue = OrderedDict()  # ticket -> {"seconds", "submissions"}, FIFO
+        self._avg_submission_seconds = 20.0
+
+    def estimate_job_seconds(self, num_responses, delay_seconds):
+        return num_responses * self._avg_submission_seconds + (num_responses - 1) * delay_seconds
+
+    def acquire(self, ticket, num_responses, delay_seconds):
+        """Block until the job may start. Returns (admitted, retry_after_seconds)."""
+        estimate = self.estimate_job_seconds(num_responses, delay_seconds)
+        with self._cond:
+            if not self._queue and self._has_room_locked():
+                self._start_locked(ticket, estimate, num_responses)
+                return True, 0
+            if len(self._queue) >= self.max_queue:
+                return False, self._retry_after_locked()
+
+            self._queue[ticket] = {"seconds": estimate, "submissions": num_responses}
+            deadline = time.monotonic() + self.queue_timeout
+            # Poll at least once a second so memory freed outside this process is noticed
+            while not (next(iter(self._queue)) is ticket and self._has_room_locked()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    del self._queue[ticket]
+                    self._cond.notify_all()
+                    return False, self._retry_after_locked()
+                self._cond.wait(timeout=min(1.0, remaining))
+            del self._queue[ticket]
+            self._start_locked(ticket, estimate, num_responses)
+            self._cond.notify_all()
+            return True, 0
+
+    def release(self, ticket):
+        with self._cond:
+            self._active.pop(ticket, None)
+            self._cond.notify_all()
+
+    def record_submission(self, seconds):
+        """Fold an observed submission duration into the running average used for estimates."""
+        with self._cond:
+            self._avg_submission_seconds = 0.8 * self._avg_submission_seconds + 0.2 * seconds
+
+    def snapshot(self):
+        with self._cond:
+            memory = _current_memory_bytes()
+            return {
+                "slots": {"total": self.slots, "active": len(self._active),
+                          "free": max(0, self.slots - len(self._active))},
+                "queue": {"depth": len(self._queue), "max": self.max_queue,
+                          "queuedSubmissions": sum(q["submissions"] for q in self._queue.values())},
+                "activeSubmissions": sum(a["submissions"] for a in self._active.values()),
+                "memoryMb": round(memory / (1024 * 1024), 1),
+                "maxMemoryMb": round(self.max_memory_bytes / (1024 * 1024), 1) if self.max_memory_bytes else None,
+                "acceptingJobs": self._has_room_locked() or len(self._queue) < self.max_queue,
+                "retryAfter": 0 if self._has_room_locked() else self._retry_after_locked(),
+            }
+
+    def _has_room_locked(self):
+        if len(self._active) >= self.slots:
+            return False
+        return not self.max_memory_bytes or _current_memory_bytes() < self.max_memory_bytes
+
+    def _start_locked(self, ticket, estimate, num_responses):
+        self._active[ticket] = {"finishAt": time.time() + estimate, "submissions": num_responses}
+
+    def _retry_after_locked(self):
+        now = time.time()
+        remaining = sorted(max(0.0, a["finishAt"] - now) for a in self._active.values())
+        first_free = remaining[0] if remaining else 0.0
+        queued = sum(q["seconds"] for q in self._queue.values()) / self.slots
+        return max(1, math.ceil(first_free + queued))
+
+
+ADMISSION = _AdmissionController(MAX_BROWSER_SLOTS, MAX_QUEUED_JOBS, MAX_MEMORY_MB * 1024 * 1024, QUEUE_TIMEOUT_SECONDS)
+if MAX_MEMORY_MB and not any(os.path.exists(path) for path, _ in _CGROUP_MEMORY_STATS):
+    print("⚠️  No cgroup memory stats found; MAX_MEMORY_MB will be checked against process-tree RSS, "
+          "which overcounts memory shared between Chromium processes")
+
+# --- New: In-memory job registry so results of a /generate call can be looked up later ---
+JOBS = {}
+_jobs_lock = threading.Lock()
+
+def _register_job(**fields):
+    job_id = uuid.uuid4().hex[:12]
+    with _jobs_lock:
+        evicted = _evict_jobs_locked()
+        JOBS[job_id] = {"id": job_id, "status": "running", "createdAt": time.time(), **fields}
+    for old_id in evicted:
+        shutil.rmtree(os.path.join(PROFILE_DIR, old_id), ignore_errors=True)
+    return job_id
+
+def _evict_jobs_locked():
+    """Drop finished jobs past JOB_TTL_SECONDS, then the oldest finished ones beyond MAX_TRACKED_JOBS."""
+    now = time.time()
+    finished = [job_id for job_id, job in JOBS.items() if job['status'] != 'running']  # oldest first
+    evicted = [job_id for job_id in finished if now - JOBS[job_id]['createdAt'] > JOB_TTL_SECONDS]
+    overflow = len(JOBS) - len(evicted) - (MAX_TRACKED_JOBS - 1)
+    if overflow > 0:
+        evicted += [job_id for job_id in finished if job_id not in evicted][:overflow]
+    for job_id in evicted:
+        del JOBS[job_id]
+    return evicted
+
+def _update_job(job_id, **fields):
+    with _jobs_lock:
+        if job_id in JOBS:
+            JOBS[job_id].update(fields)
+
+def _get_job(job_id):
+    with _jobs_lock:
+        job = JOBS.get(job_id)
+        return dict(job) if job else None
+
+# --- New: Per-submission stage timing and opt-in profiling ---
+class _StageTimer:
+    """Records wall-clock milliseconds spent in each stage, from navigation to submit."""
+
+    def __init__(self):
+        self.stages = {}
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    def as_dict(self):
+        return {"stages": dict(self.stages), "totalMs": round((self._last - self._start) * 1000, 1)}
+
+
+def _parse_profile_option(value, num_responses):
+    """Turn the `profile` request option into the set of 1-based submission numbers to profile.
+
+    Accepts a boolean (profile every submission) or a list of submission numbers.
+    Returns None when the option is malformed.
+    """
+    if value is None or value is False:
+        return set()
+    if value is True:
+        return set(range(1, num_responses + 1))
+    if isinstance(value, list) and all(isinstance(n, int) and not isinstance(n, bool) for n in value):
+        return {n for n in value if 1 <= n <= num_responses}
+    return None
+
+
+def _start_profile(page):
+    """Start a Playwright trace and a CPU profile for one submission."""
+    page.context.tracing.start(screenshots=True, snapshots=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _save_profile(job_id, submission, page, profiler, timer):
+    """Stop profiling one submission and write its artifacts under PROFILE_DIR/<job_id>/."""
+    profiler.disable()
+    job_dir = os.path.join(PROFILE_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    prefix = f"submission-{submission}"
+    try:
+        page.context.tracing.stop(path=os.path.join(job_dir, f"{prefix}-trace.zip"))
+    except Exception as e:
+        print(f"⚠️  Could not save Playwright trace for submission {submission}: {e}")
+    profiler.dump_stats(os.path.join(job_dir, f"{prefix}-cpu.prof"))
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+    with open(os.path.join(job_dir, f"{prefix}-cpu.txt"), 'w') as f:
+        f.write(summary.getvalue())
+    timings = {"submission": submission, **timer.as_dict()}
+    with open(os.path.join(job_dir, f"{prefix}-timings.json"), 'w') as f:
+        json.dump(timings, f, indent=2)
+    print(f"⏱️  Profiled submission {submission}: {timings['totalMs']}ms total")
+    return timings
+
+
+def _record_profile(job_id, submission, page, profiler, timer):
+    """Save a submission's profile and list its timings on the job for /jobs/<id>/profile."""
+    timings = _save_profile(job_id, submission, page, profiler, timer)
+    with _jobs_lock:
+        if job_id in JOBS:
+            JOBS[job_id]["profiles"].append(timings)
+
+# --- New: Streaming per-submission results log ---
+def _build_results_logger():
+    os.makedirs(os.path.dirname(RESULTS_LOG_PATH) or '.', exist_ok=True)
+    handler = RotatingFileHandler(RESULTS_LOG_PATH, maxBytes=RESULTS_LOG_MAX_MB * 1024 * 1024,
+                                  backupCount=RESULTS_LOG_BACKUPS, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger = logging.getLogger('form_filler.results')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger
+
+
+RESULTS_LOG = _build_results_logger()
+
+
+def _write_result(job_id, submission, form_url, identity, answers, timer, outcome,
+                  confirmed=False, error=None, asset_cache=None):
+    """Append one submission's record to the results log as a single compact JSON line."""
+    record = {
+        "jobId": job_id,  # kept first so exports can filter lines without parsing them
+        "submission": submission,
+        "finishedAt": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "formUrl": form_url,
+        "identity": identity,
+        "answers": answers,
+        "timings": timer.as_dict(),
+        "outcome": outcome,
+        "confirmed": confirmed,
+    }
+    if error:
+        record["error"] = error
+    if asset_cache:
+        record["assetCache"] = asset_cache
+    RESULTS_LOG.info(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+
+
+def _iter_job_results(job_id):
+    """Yield a job's records line by line, oldest rotated file first, without loading whole files.
+
+    Every file is opened before reading starts: open handles keep following their file when a
+    rollover renames it, so records are not skipped if the log rotates mid-export.
+    """
+    prefix = '{"jobId":' + json.dumps(job_id) + ','
+    handles, seen = [], set()
+    # Newest first, so a rename racing with this loop shows up as an inode we already hold
+    for path in [RESULTS_LOG_PATH] + [f"{RESULTS_LOG_PATH}.{n}" for n in range(1, RESULTS_LOG_BACKUPS + 1)]:
+        try:
+            f = open(path, encoding='utf-8')
+        except OSError:
+            continue
+        inode = os.fstat(f.fileno()).st_ino
+        if inode in seen:
+            f.close()
+            continue
+        seen.add(inode)
+        handles.append(f)
+    try:
+        for f in reversed(handles):
+            for line in f:
+                if line.startswith(prefix):
+                    yield line
+    finally:
+        for f in handles:
+            f.close()
+
 # Health check endpoint for deployment
 @app.route('/', methods=['GET'])
 def health_check():
@@ -312,10 +958,18 @@ def health_check():
         "version": "2.0",
         "endpoints": {
             "generate": "/generate (POST)",
+            "profile": "/jobs/<id>/profile (GET)",
+            "results": "/jobs/<id>/results (GET)",
+            "capacity": "/capacity (GET)",
             "health": "/ (GET)"
         }
     }), 200
 
+@app.route('/capacity', methods=['GET'])
+def capacity():
+    """Current browser slots, queue depth and memory so a load balancer can route around busy workers."""
+    return jsonify(ADMISSION.snapshot()), 200
+
 @app.route('/generate', methods=['POST'])
 def generate():
     data = request.get_json()
@@ -342,6 +996,28 @@ def generate():
     if total_delay > 300:  # Maximum 5 minutes
         return jsonify({"message": "Time interval cannot exceed 5 minutes."}), 400
 
+    # Optional profiling: true for every submission, or a list of submission numbers (1-based)
+    profile_submissions = _parse_profile_option(data.get('profile'), num_responses)
+    if profile_submissions is None:
+        return jsonify({"message": "profile must be true/false or a list of submission numbers."}), 400
+
+    # Wait for a free browser slot (bounded queue) or turn the job away with a Retry-After estimate
+    ticket = object()
+    admitted, retry_after = ADMISSION.acquire(ticket, num_responses, total_delay)
+    if not admitted:
+        response = jsonify({
+            "message": "Worker is at capacity, please retry later.",
+            "retryAfter": retry_after,
+            "capacity": ADMISSION.snapshot()
+        })
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+
+    job_id = _register_job(formUrl=form_url, numResponses=num_responses,
+                           profiled=sorted(profile_submissions), profiles=[], assetCache=[])
+
+    profiler = None
+    current_submission = None
     try:
         with sync_playwright() as p:
             for i in range(num_responses):
@@ -349,19 +1025,30 @@ def generate():
                 if i > 0:  # No delay before first response
                     time.sleep(total_delay)
                 
+                submission_started = time.monotonic()
                 # Generate a single Indian identity per submission
                 identity = _generate_indian_identity()
+                # Start the record before launching Chromium so launch failures are logged too
+                timer = _StageTimer()
+                answers = {}
+                current_submission = i + 1
                 
                 browser = p.chromium.launch(headless=False)  # Changed to visible for debugging
                 page = browser.new_page()
+                asset_stats = ASSET_CACHE.attach(page.context) if ASSET_CACHE else None
+                timer.mark('browser_launch')
+                
+                profiler = _start_profile(page) if current_submission in profile_submissions else None
                 
                 page.goto(form_url, wait_until='networkidle', timeout=60000)
+                timer.mark('navigation')
                 
                 # Wait for form to load
                 page.wait_for_timeout(3000)
                 
                 # Verify we're on a Google Form
                 page_title = page.title()
+                timer.mark('form_load')
 
                 # 1. Fill short text input fields (NOT in grids - those are handled in step 7)
                 # We'll collect all text inputs first, then filter out grid inputs
@@ -433,58 +1120,66 @@ def generate():
                     # Priority 1: Check for EMAIL (must check first!)
                     if _is_email_label(label_text):
                         print(f"   ✉️  EMAIL detected → {identity['email']}")
-                        input.fill(identity['email'])
+                        value = identity['email']
                         filled = True
                     # Priority 2: Check for specific name types
                     elif 'first name' in label_text or 'given name' in label_text:
                         print(f"   👤 FIRST NAME detected → {identity['first']}")
-                        input.fill(identity['first'])
+                        value = identity['first']
                         filled = True
                     elif 'last name' in label_text or 'surname' in label_text or 'family name' in label_text:
                         print(f"   👤 LAST NAME detected → {identity['last']}")
-                        input.fill(identity['last'])
+                        value = identity['last']
                         filled = True
                     elif _is_generic_name_label(label_text):
                         print(f"   👤 NAME detected → {identity['full']}")
-                        input.fill(identity['full'])
+                        value = identity['full']
                         filled = True
                     # Priority 3: Other field types
                     elif 'phone' in label_text or 'mobile' in label_text or 'contact' in label_text:
                         print(f"   📞 PHONE detected")
-                        input.fill(fake.phone_number())
+                        value = fake.phone_number()
                         filled = True
                     elif 'address' in label_text:
                         print(f"   🏠 ADDRESS detected")
-                        input.fill(fake.address())
+                        value = fake.address()
                         filled = True
                     elif 'city' in label_text:
                         print(f"   🏙️  CITY detected")
-                        input.fill(fake.city())
+                        value = fake.city()
                         filled = True
                     elif 'company' in label_text or 'organization' in label_text:
                         print(f"   🏢 COMPANY detected")
-                        input.fill(fake.company())
+                        value = fake.company()
                         filled = True
                     
                     # SMART DEFAULT: If label is empty/unclear, use alternating pattern NAME → EMAIL → NAME → EMAIL
                     if not filled:
                         if processed_field_count % 2 == 0:
                             print(f"   👤 No clear label → Applying pattern: NAME → {identity['full']}")
-                            input.fill(identity['full'])
+                            value = identity['full']
                         else:
                             print(f"   ✉️  No clear label → Applying pattern: EMAIL → {identity['email']}")
-                            input.fill(identity['email'])
+                            value = identity['email']
+                    
+                    input.fill(value)
+                    _record_answer(answers, _answer_key(question_text or aria_label or placeholder, f"Text input {processed_field_count + 1}"), value)
                     
                     processed_field_count += 1
 
+                timer.mark('text_inputs')
+
                 # 2. Fill email fields
                 email_inputs = page.query_selector_all('input[type="email"]')
                 for input in email_inputs:
                     input.fill(identity['email'])
+                    _record_answer(answers, _answer_key(input.get_attribute('aria-label'), "Email"), identity['email'])
+
+                timer.mark('email_inputs')
 
                 # 3. Fill paragraph/long-form text areas
                 textareas = page.query_selector_all('textarea')
-                for textarea in textareas:
+                for textarea_idx, textarea in enumerate(textareas):
                     # Get the question text for context
                     aria_label = textarea.get_attribute('aria-label') or ''
                     placeholder = textarea.get_attribute('placeholder') or ''
@@ -511,40 +1206,43 @@ def generate():
                     
                     # If the question is clearly asking for name/email, fill identity values directly (thumb rule)
                     if _is_email_label(lt):
-                        textarea.fill(identity['email'])
-                        continue
-                    if 'first name' in lt or 'given name' in lt:
-                        textarea.fill(identity['first'])
-                        continue
-                    if 'last name' in lt or 'surname' in lt or 'family name' in lt:
-                        textarea.fill(identity['last'])
-                        continue
-                    if _is_generic_name_label(lt) or 'name' in lt:
+                        response = identity['email']
+                    elif 'first name' in lt or 'given name' in lt:
+                        response = identity['first']
+                    elif 'last name' in lt or 'surname' in lt or 'family name' in lt:
+                        response = identity['last']
+                    elif _is_generic_name_label(lt) or 'name' in lt:
                         # Thumb rule: any textarea asking for "name" gets Indian full name
-                        textarea.fill(identity['full'])
-                        continue
-                    
-                    # Generate contextual response with user's context and tone
-                    response = generate_ai_response(
-                        question_text or "general question",
-                        form_context,
-                        response_tone
-                    )
+                        response = identity['full']
+                    else:
+                        # Generate contextual response with user's context and tone
+                        response = generate_ai_response(
+                            question_text or "general question",
+                            form_context,
+                            response_tone
+                        )
                     textarea.fill(response)
+                    _record_answer(answers, _answer_key(question_text or placeholder, f"Paragraph {textarea_idx + 1}"), response)
 
-                # 4. Handle radio buttons (single choice)
-                radio_groups = page.query_selector_all('div[role="radiogroup"]')
-                for group in radio_groups:
+                timer.mark('textareas')
+
+                # 4. Handle radio buttons (single choice) - linear scales are radiogroups too, handled in step 6
+                radio_groups = page.query_selector_all('div[role="radiogroup"]:not(.freebirdMaterialScalecontentContainer)')
+                for group_idx, group in enumerate(radio_groups):
                     radios = group.query_selector_all('div[role="radio"]')
                     if radios:
                         # Select random radio button
                         selected_index = fake.random_int(min=0, max=len(radios)-1)
                         radios[selected_index].click()
+                        _record_answer(answers, _question_label(page, group, f"Choice {group_idx + 1}"),
+                                       _option_label(radios[selected_index]))
                         page.wait_for_timeout(300)
 
+                timer.mark('radio_buttons')
+
                 # 5. Handle checkboxes (multiple choice)
                 checkbox_groups = page.query_selector_all('div[role="list"]')
-                for group in checkbox_groups:
+                for group_idx, group in enumerate(checkbox_groups):
                     checkboxes = group.query_selector_all('div[role="checkbox"]')
                     if checkboxes:
                         # Randomly select 1-3 checkboxes
@@ -553,10 +1251,14 @@ def generate():
                         for idx in selected:
                             checkboxes[idx].click()
                             page.wait_for_timeout(200)
+                        _record_answer(answers, _question_label(page, group, f"Checkboxes {group_idx + 1}"),
+                                       [_option_label(checkboxes[idx]) for idx in selected])
+
+                timer.mark('checkboxes')
 
                 # 6. Handle linear scale ratings (1-10, 1-5, etc.)
                 scale_groups = page.query_selector_all('div[role="radiogroup"].freebirdMaterialScalecontentContainer')
-                for group in scale_groups:
+                for group_idx, group in enumerate(scale_groups):
                     scale_options = group.query_selector_all('div[role="radio"]')
                     if scale_options:
                         # Tend towards middle-to-high ratings (more realistic)
@@ -564,11 +1266,16 @@ def generate():
                         # Weight towards 60-90% of the scale
                         weighted_index = random.randint(int(num_options * 0.6), num_options - 1)
                         scale_options[weighted_index].click()
+                        _record_answer(answers, _question_label(page, group, f"Scale {group_idx + 1}"),
+                                       _option_label(scale_options[weighted_index]))
                         page.wait_for_timeout(300)
 
+                timer.mark('linear_scales')
+
                 # 7. Handle grid questions (rows and columns)
                 grid_questions = page.query_selector_all('div[role="group"]')
-                for grid in grid_questions:
+                for grid_idx, grid in enumerate(grid_questions):
+                    grid_label = _question_label(page, grid, f"Grid {grid_idx + 1}")
                     # First, check if this grid has text input fields (like Name/Email grid)
                     grid_inputs = grid.query_selector_all('input[type="text"]')
                     if grid_inputs:
@@ -608,35 +1315,39 @@ def generate():
                             # Apply thumb rule: Check EMAIL FIRST (priority), then Name columns
                             if _is_email_label(col_header):
                                 print(f"      ✉️  Filling EMAIL: {identity['email']}")
-                                input.fill(identity['email'])
+                                value = identity['email']
                             elif 'first name' in col_header or 'given name' in col_header:
                                 print(f"      👤 Filling FIRST NAME: {identity['first']}")
-                                input.fill(identity['first'])
+                                value = identity['first']
                             elif 'last name' in col_header or 'surname' in col_header:
                                 print(f"      👤 Filling LAST NAME: {identity['last']}")
-                                input.fill(identity['last'])
+                                value = identity['last']
                             elif 'name' in col_header or _is_generic_name_label(col_header):
                                 print(f"      👤 Filling FULL NAME: {identity['full']}")
-                                input.fill(identity['full'])
+                                value = identity['full']
                             else:
                                 # If we can't detect header, use alternating pattern: name, email, name, email...
                                 if col_idx % 2 == 0:
                                     print(f"      👤 Filling NAME (pattern): {identity['full']}")
-                                    input.fill(identity['full'])
+                                    value = identity['full']
                                 else:
                                     print(f"      ✉️  Filling EMAIL (pattern): {identity['email']}")
-                                    input.fill(identity['email'])
+                                    value = identity['email']
+                            input.fill(value)
+                            _record_answer(answers, f"{grid_label} [{col_header or f'Input {idx + 1}'}]", value)
                             page.wait_for_timeout(200)
                         continue
                     
                     # Otherwise, handle radio/checkbox grids as before
                     rows = grid.query_selector_all('div[role="listitem"]')
-                    for row in rows:
+                    for row_idx, row in enumerate(rows):
+                        row_key = f"{grid_label} [{_question_label(page, row, f'Row {row_idx + 1}')}]"
                         # Try radio buttons first
                         radio_options = row.query_selector_all('div[role="radio"]')
                         if radio_options:
                             selected = random.randint(0, len(radio_options) - 1)
                             radio_options[selected].click()
+                            _record_answer(answers, row_key, _option_label(radio_options[selected]))
                             page.wait_for_timeout(200)
                         else:
                             # Try checkboxes
@@ -648,18 +1359,25 @@ def generate():
                                 for idx in selected:
                                     checkbox_options[idx].click()
                                     page.wait_for_timeout(200)
+                                _record_answer(answers, row_key, [_option_label(checkbox_options[idx]) for idx in selected])
+
+                timer.mark('grids')
 
                 # 8. Handle dropdown/select menus
                 dropdowns = page.query_selector_all('div[role="listbox"]')
-                for dropdown in dropdowns:
+                for dropdown_idx, dropdown in enumerate(dropdowns):
+                    dropdown_key = _question_label(page, dropdown, f"Dropdown {dropdown_idx + 1}")
                     dropdown.click()
                     page.wait_for_timeout(500)
                     options = page.query_selector_all('div[role="option"]')
                     if options:
                         selected = random.randint(0, len(options) - 1)
+                        _record_answer(answers, dropdown_key, _option_label(options[selected]))
                         options[selected].click()
                         page.wait_for_timeout(300)
 
+                timer.mark('dropdowns')
+
                 # Submit the form - try multiple methods
                 submitted = False
                 
@@ -697,11 +1415,34 @@ def generate():
                     
                 except Exception as e:
                     if not submitted:
+                        if profiler:
+                            _record_profile(job_id, i + 1, page, profiler, timer)
+                            profiler = None
+                        _write_result(job_id, i + 1, form_url, identity, answers, timer, "submit_failed", error=str(e))
+                        current_submission = None
                         browser.close()
-                        return jsonify({"message": f"Could not submit form: {str(e)}"}), 500
+                        _update_job(job_id, status="failed")
+                        return jsonify({"message": f"Could not submit form: {str(e)}", "jobId": job_id}), 500
+                timer.mark('submit')
 
                 page.wait_for_timeout(3000)  # Wait for submission to complete
+                confirmed = _submission_confirmed(page)
+                timer.mark('confirmation')
+                if profiler:
+                    _record_profile(job_id, i + 1, page, profiler, timer)
+                    profiler = None
+                cache_summary = None
+                if asset_stats:
+                    cache_summary = {"submission": i + 1, **_StaticAssetCache.summarize(asset_stats)}
+                    print(f"📦 Asset cache: {cache_summary['hits']} hits / {cache_summary['misses']} misses "
+                          f"({cache_summary['hitRatio']:.0%}), {cache_summary['bytesServed']} bytes served locally")
+                    with _jobs_lock:
+                        JOBS[job_id]["assetCache"].append(cache_summary)
+                _write_result(job_id, i + 1, form_url, identity, answers, timer,
+                              "submitted", confirmed=confirmed, asset_cache=cache_summary)
+                current_submission = None
                 browser.close()
+                ADMISSION.record_submission(time.monotonic() - submission_started)
 
                 print(f"✓ Response {i+1} of {num_responses} completed successfully!")
         
@@ -714,11 +1455,64 @@ def generate():
         else:
             interval_msg = f"{interval_seconds}s"
             
+        _update_job(job_id, status="completed")
         return jsonify({
-            "message": f"Successfully generated {num_responses} responses with {interval_msg} intervals!"
+            "message": f"Successfully generated {num_responses} responses with {interval_msg} intervals!",
+            "jobId": job_id,
+            "assetCache": _get_job(job_id)["assetCache"]
         }), 200
     except Exception as e:
-        return jsonify({"message": "Error generating responses.", "details": str(e)}), 500
+        if profiler:
+            # A failed submission (e.g. a navigation timeout) is exactly what profiling is for
+            try:
+                _record_profile(job_id, i + 1, page, profiler, timer)
+            except Exception as save_error:
+                profiler.disable()
+                print(f"⚠️  Could not save profile for submission {i + 1}: {save_error}")
+        if current_submission:
+            _write_result(job_id, current_submission, form_url, identity, answers, timer, "error", error=str(e))
+        _update_job(job_id, status="failed")
+        return jsonify({"message": "Error generating responses.", "details": str(e), "jobId": job_id}), 500
+    finally:
+        ADMISSION.release(ticket)
+
+@app.route('/jobs/<job_id>/profile', methods=['GET'])
+def job_profile(job_id):
+    """List the profiled submissions of a job with their stage timings and artifact download links."""
+    job = _get_job(job_id)
+    if not job:
+        return jsonify({"message": "Job not found."}), 404
+    if not job.get('profiled'):
+        return jsonify({"message": "Profiling was not enabled for this job."}), 404
+
+    job_dir = os.path.join(PROFILE_DIR, job_id)
+    artifacts = sorted(os.listdir(job_dir)) if os.path.isdir(job_dir) else []
+    return jsonify({
+        "jobId": job_id,
+        "status": job['status'],
+        "submissions": job['profiles'],
+        "artifacts": [
+            {"name": name, "url": f"/jobs/{job_id}/profile/{name}"} for name in artifacts
+        ]
+    }), 200
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """Stream a job's per-submission records as JSON lines straight from the (rotated) results log."""
+    lines = _iter_job_results(job_id)
+    first = next(lines, None)
+    # Records outlive the in-memory registry, so only 404 when neither knows the job
+    if first is None and not _get_job(job_id):
+        return jsonify({"message": "Job not found."}), 404
+    return Response(itertools.chain([first] if first else [], lines), mimetype='application/x-ndjson',
+                    headers={"Content-Disposition": f'attachment; filename="{job_id}-results.jsonl"'})
+
+@app.route('/jobs/<job_id>/profile/<artifact>', methods=['GET'])
+def job_profile_artifact(job_id, artifact):
+    """Download one profiling artifact (trace zip, .prof CPU profile, text summary or timings)."""
+    if not _get_job(job_id):
+        return jsonify({"message": "Job not found."}), 404
+    return send_from_directory(os.path.join(PROFILE_DIR, job_id), artifact, as_attachment=True)
 
 if __name__ == '__main__':
     # Use environment variable PORT for deployment platforms like Render